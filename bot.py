@@ -8,6 +8,7 @@
 # - модерация (очередь + тикеты) с режимами: owner | admins | selected
 # - очередь pending в меню контроля
 # - логирование: технические + event_log (без имён)
+# - long polling по умолчанию; webhook, если задан WEBHOOK_URL (порт — PORT, по умолчанию 8443)
 #
 # ВАЖНО про Markdown:
 # Telegram "MarkdownV2" строгий. Файл privacy_anon.md должен быть написан в MarkdownV2 (или очень аккуратном markdown).
@@ -19,22 +20,43 @@ import os
 import re
 import base64
 import hashlib
+import functools
+import time
 import asyncio
 import logging
 import datetime as dt
-from typing import Optional, Tuple, List, Dict, Any
+import importlib.util
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple, List, Dict, Any, FrozenSet, Set, Callable, Awaitable
 
 import aiosqlite
 from dotenv import load_dotenv
 
+try:
+    import uvloop  # опционально: pip install uvloop (быстрее стандартного event loop)
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson  # опционально: pip install orjson (быстрый разбор ответов Telegram)
+except ImportError:
+    orjson = None
+
 from telegram import (
     Update,
+    CallbackQuery,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     Message,
+    InputMediaPhoto,
+    InputMediaVideo,
+    InputMediaDocument,
+    InputMediaAudio,
 )
 from telegram.constants import ChatMemberStatus, ParseMode
 from telegram.error import BadRequest, Forbidden
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -51,6 +73,9 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
 BOT_OWNER_ID = int(os.getenv("BOT_OWNER_ID", "0").strip() or "0")  # владелец бота (можно слать события/ошибки)
 DEEPLINK_SALT = os.getenv("DEEPLINK_SALT", "").strip()
+LOG_UPDATES = os.getenv("LOG_UPDATES", "").strip() == "1"  # отладочный лог каждого апдейта
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")  # https://host[:port][/prefix]; пусто — long polling
+WEBHOOK_PORT = int(os.getenv("PORT", "8443").strip() or "8443")
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN не найден. Проверь .env и load_dotenv().")
@@ -75,14 +100,76 @@ def setup_logging():
 
 logger = logging.getLogger("podslushano")
 
-async def event_log(context: ContextTypes.DEFAULT_TYPE, text: str):
-    """Событийный лог без username/имён (можно слать владельцу бота)."""
+# event_log не должен держать ответ пользователю: сообщения владельцу уходят через
+# ограниченную очередь, которую разбирает одна фоновая задача (пачками до EVENT_LOG_BATCH строк;
+# потребитель один — иначе пачки не набираются и порядок событий теряется)
+EVENT_LOG_QUEUE_MAX = 1024
+EVENT_LOG_BATCH = 10
+EVENT_LOG_WINDOW = 0.2  # сек: сколько ждать добора пачки
+
+EVENT_LOG_QUEUE: Optional[asyncio.Queue] = None
+EVENT_LOG_TASK: Optional[asyncio.Task] = None
+EVENT_LOG_DROPPED = 0
+
+def event_log(context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Событийный лог без username/имён: в logger сразу, владельцу бота — через фоновую очередь."""
+    global EVENT_LOG_DROPPED
     logger.info("[EVENT] %s", text)
-    if BOT_OWNER_ID:
+    if EVENT_LOG_QUEUE is not None:
+        try:
+            EVENT_LOG_QUEUE.put_nowait(text)
+        except asyncio.QueueFull:
+            EVENT_LOG_DROPPED += 1
+
+async def _event_log_worker(bot):
+    """Забирает события из очереди и шлёт владельцу одной пачкой за окно EVENT_LOG_WINDOW."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await EVENT_LOG_QUEUE.get()]
+        deadline = loop.time() + EVENT_LOG_WINDOW
+        while len(batch) < EVENT_LOG_BATCH:
+            # уже лежащее забираем сразу, ждём только недостающее
+            if not EVENT_LOG_QUEUE.empty():
+                batch.append(EVENT_LOG_QUEUE.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(EVENT_LOG_QUEUE.get(), timeout))
+            except asyncio.TimeoutError:
+                break
         try:
-            await context.bot.send_message(BOT_OWNER_ID, f"🧾 {text}")
+            await bot.send_message(BOT_OWNER_ID, "\n".join(f"🧾 {t}" for t in batch))
         except Exception:
             pass
+        finally:
+            for _ in batch:
+                EVENT_LOG_QUEUE.task_done()
+
+async def event_log_start(app: Application):
+    """post_init hook: очередь и воркер event_log (только если есть владелец бота)."""
+    global EVENT_LOG_QUEUE, EVENT_LOG_TASK
+    if not BOT_OWNER_ID:
+        return
+    EVENT_LOG_QUEUE = asyncio.Queue(maxsize=EVENT_LOG_QUEUE_MAX)
+    EVENT_LOG_TASK = asyncio.create_task(_event_log_worker(app.bot))
+
+async def event_log_stop(app: Application):
+    """post_stop hook: досылаем хвост очереди (пока бот ещё не закрыт) и гасим воркер."""
+    global EVENT_LOG_QUEUE, EVENT_LOG_TASK
+    if EVENT_LOG_QUEUE is None:
+        return
+    try:
+        await asyncio.wait_for(EVENT_LOG_QUEUE.join(), 5)
+    except asyncio.TimeoutError:
+        pass
+    EVENT_LOG_TASK.cancel()
+    await asyncio.gather(EVENT_LOG_TASK, return_exceptions=True)
+    EVENT_LOG_TASK = None
+    EVENT_LOG_QUEUE = None
+    if EVENT_LOG_DROPPED:
+        logger.warning("event_log: очередь переполнялась, отброшено событий: %d", EVENT_LOG_DROPPED)
 
 # ----------------- POLICY LOADER -----------------
 def load_policy_text_and_hash() -> Tuple[str, str]:
@@ -106,75 +193,121 @@ def load_policy_text_and_hash() -> Tuple[str, str]:
     h = hashlib.sha256(txt.encode("utf-8")).hexdigest()
     return txt, h
 
+# MarkdownV2: вне `code` и URL ссылок эти символы обязаны быть экранированы.
+# Если в тексте есть неэкранированные — Telegram его не распарсит, и нет смысла пробовать на каждом показе.
+MDV2_VERBATIM_RE = re.compile(r"```.*?```|`[^`\n]*`|\]\([^)]*\)", re.S)
+# ( ) | всегда; > — кроме начала строки (там это цитата); || — разметка спойлера, одиночный | — нет
+MDV2_UNESCAPED_RE = re.compile(r"(?<!\\)(?:[#+\-={}.!()]|(?<!^)>|(?<!\|)\|(?!\|))", re.M)
+
+def policy_parse_mode(txt: str) -> Optional[str]:
+    if MDV2_UNESCAPED_RE.search(MDV2_VERBATIM_RE.sub("", txt)):
+        return None
+    return ParseMode.MARKDOWN_V2
+
 POLICY_TEXT, POLICY_HASH = load_policy_text_and_hash()
+POLICY_PARSE_MODE = policy_parse_mode(POLICY_TEXT)
 
 # ----------------- DB + MIGRATIONS -----------------
-async def table_exists(db: aiosqlite.Connection, name: str) -> bool:
-    async with db.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-        (name,),
-    ) as cur:
-        row = await cur.fetchone()
-        return row is not None
-
-async def column_exists(db: aiosqlite.Connection, table: str, col: str) -> bool:
-    async with db.execute(f"PRAGMA table_info({table})") as cur:
-        rows = await cur.fetchall()
-    return any(r[1] == col for r in rows)
+async def load_schema(db: aiosqlite.Connection) -> Dict[str, Set[str]]:
+    """{table: {columns}} для всех таблиц — одним запросом."""
+    rows = await db.execute_fetchall(
+        "SELECT m.name, p.name FROM sqlite_master m JOIN pragma_table_info(m.name) p WHERE m.type='table'"
+    )
+    schema: Dict[str, Set[str]] = {}
+    for table, col in rows:
+        schema.setdefault(table, set()).add(col)
+    return schema
 
-async def db_init_and_migrate():
-    async with aiosqlite.connect(DB_PATH) as db:
-        # --- users consent table ---
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS user_consents (
-            user_id INTEGER PRIMARY KEY,
-            accepted INTEGER NOT NULL,
-            policy_hash TEXT NOT NULL,
-            accepted_at TEXT NOT NULL
-        )
-        """)
+DB: Optional[aiosqlite.Connection] = None  # одно долгоживущее соединение на весь процесс
+# Защита на будущее: сейчас апдейты обрабатываются по одному (concurrent_updates не включён),
+# но при параллельной обработке запись + COMMIT двух корутин могли бы перемешаться в одной транзакции.
+DB_WRITE_LOCK = asyncio.Lock()
 
-        # --- base tables ---
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS channels (
-            chat_id INTEGER PRIMARY KEY,
-            username TEXT,
-            owner_user_id INTEGER NOT NULL,
-            moderation INTEGER NOT NULL DEFAULT 1,
-            reviewers_mode TEXT NOT NULL DEFAULT 'owner',  -- owner | admins | selected
-            created_at TEXT NOT NULL
-        )
-        """)
+async def db_init_and_migrate():
+    global DB
+    DB = db = await aiosqlite.connect(DB_PATH, cached_statements=256)
+    # PRAGMA действуют на соединение — ставим один раз на общее
+    await db.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA mmap_size=67108864;
+    """)
+
+    # --- users consent table ---
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS user_consents (
+        user_id INTEGER PRIMARY KEY,
+        accepted INTEGER NOT NULL,
+        policy_hash TEXT NOT NULL,
+        accepted_at TEXT NOT NULL
+    )
+    """)
+
+    # --- base tables ---
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS channels (
+        chat_id INTEGER PRIMARY KEY,
+        username TEXT,
+        owner_user_id INTEGER NOT NULL,
+        moderation INTEGER NOT NULL DEFAULT 1,
+        reviewers_mode TEXT NOT NULL DEFAULT 'owner',  -- owner | admins | selected
+        created_at TEXT NOT NULL
+    )
+    """)
 
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS deeplinks (
+        code TEXT PRIMARY KEY,
+        chat_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS channel_reviewers (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY(chat_id, user_id)
+    )
+    """)
+
+    schema = await load_schema(db)
+
+    # --- migrations for channels (old DBs) ---
+    channel_cols = schema.get("channels")
+    if channel_cols is not None:
+        if "reviewers_mode" not in channel_cols:
+            await db.execute("ALTER TABLE channels ADD COLUMN reviewers_mode TEXT NOT NULL DEFAULT 'owner'")
+        if "moderation" not in channel_cols:
+            await db.execute("ALTER TABLE channels ADD COLUMN moderation INTEGER NOT NULL DEFAULT 1")
+        if "username" not in channel_cols:
+            await db.execute("ALTER TABLE channels ADD COLUMN username TEXT")
+
+    # --- submissions: ensure NEW schema ---
+    submission_cols = schema.get("submissions")
+    if submission_cols is None:
         await db.execute("""
-        CREATE TABLE IF NOT EXISTS deeplinks (
-            code TEXT PRIMARY KEY,
+        CREATE TABLE submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
             chat_id INTEGER NOT NULL,
+            sender_user_id INTEGER NOT NULL,
+            content_type TEXT NOT NULL,
+            text TEXT,
+            file_id TEXT,
+            status TEXT NOT NULL,
             created_at TEXT NOT NULL
         )
         """)
+    else:
+        required = {"chat_id", "sender_user_id", "content_type", "file_id", "status", "created_at"}
+        if not required <= submission_cols:
+            ts = int(dt.datetime.now(dt.UTC).timestamp())
+            legacy_name = f"submissions_legacy_{ts}"
+            await db.execute(f"ALTER TABLE submissions RENAME TO {legacy_name}")
 
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS channel_reviewers (
-            chat_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            PRIMARY KEY(chat_id, user_id)
-        )
-        """)
-
-        # --- migrations for channels (old DBs) ---
-        if await table_exists(db, "channels"):
-            if not await column_exists(db, "channels", "reviewers_mode"):
-                await db.execute("ALTER TABLE channels ADD COLUMN reviewers_mode TEXT NOT NULL DEFAULT 'owner'")
-            if not await column_exists(db, "channels", "moderation"):
-                await db.execute("ALTER TABLE channels ADD COLUMN moderation INTEGER NOT NULL DEFAULT 1")
-            if not await column_exists(db, "channels", "username"):
-                await db.execute("ALTER TABLE channels ADD COLUMN username TEXT")
-
-        # --- submissions: ensure NEW schema ---
-        submissions_exists = await table_exists(db, "submissions")
-        if not submissions_exists:
             await db.execute("""
             CREATE TABLE submissions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -187,143 +320,201 @@ async def db_init_and_migrate():
                 created_at TEXT NOT NULL
             )
             """)
-        else:
-            has_chat_id = await column_exists(db, "submissions", "chat_id")
-            has_sender = await column_exists(db, "submissions", "sender_user_id")
-            has_content_type = await column_exists(db, "submissions", "content_type")
-            has_file_id = await column_exists(db, "submissions", "file_id")
-            has_status = await column_exists(db, "submissions", "status")
-            has_created = await column_exists(db, "submissions", "created_at")
-
-            if not (has_chat_id and has_sender and has_content_type and has_file_id and has_status and has_created):
-                ts = int(dt.datetime.now(dt.UTC).timestamp())
-                legacy_name = f"submissions_legacy_{ts}"
-                await db.execute(f"ALTER TABLE submissions RENAME TO {legacy_name}")
-
-                await db.execute("""
-                CREATE TABLE submissions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    sender_user_id INTEGER NOT NULL,
-                    content_type TEXT NOT NULL,
-                    text TEXT,
-                    file_id TEXT,
-                    status TEXT NOT NULL,
-                    created_at TEXT NOT NULL
-                )
-                """)
-                # Старые записи остаются в legacy (их нельзя корректно перенести без chat_id).
-
-        await db.commit()
+            # Старые записи остаются в legacy (их нельзя корректно перенести без chat_id).
+
+    # --- indexes for hot queries (pending-очередь, список каналов владельца) ---
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_sub_chat_status_id ON submissions(chat_id, status, id DESC)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_channels_owner ON channels(owner_user_id)")
+
+    await db.commit()
+
+    # все привязанные каналы -> владелец (каналов мало, держим целиком в памяти)
+    CHANNEL_OWNER.clear()
+    CHANNEL_OWNER.update((int(c), int(o)) for c, o in await db.execute_fetchall(SQL_GET_CHANNEL_OWNERS))
+
+async def db_close(app: Application):
+    """post_shutdown hook: закрываем общее соединение."""
+    global DB
+    if DB is not None:
+        await DB.close()
+        DB = None
+
+def now_iso() -> str:
+    """UTC-время в ISO 8601 для created_at/accepted_at."""
+    return dt.datetime.now(dt.UTC).isoformat()
+
+# ---- SQL ----
+# Фиксированные тексты запросов: sqlite3 кэширует скомпилированные statement'ы по строке.
+SQL_GET_CONSENT = "SELECT accepted, policy_hash FROM user_consents WHERE user_id=?"
+SQL_SET_CONSENT = """
+INSERT INTO user_consents(user_id, accepted, policy_hash, accepted_at)
+VALUES(?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    accepted=excluded.accepted,
+    policy_hash=excluded.policy_hash,
+    accepted_at=excluded.accepted_at
+RETURNING accepted, policy_hash
+"""
+SQL_UPSERT_CHANNEL = """
+INSERT INTO channels(chat_id, username, owner_user_id, moderation, reviewers_mode, created_at)
+VALUES(?, ?, ?, ?, 'owner', ?)
+ON CONFLICT(chat_id) DO UPDATE SET
+    username=excluded.username,
+    owner_user_id=excluded.owner_user_id
+"""
+SQL_GET_CHANNEL = "SELECT chat_id, username, owner_user_id, moderation, reviewers_mode FROM channels WHERE chat_id=?"
+SQL_GET_CHANNEL_OWNERS = "SELECT chat_id, owner_user_id FROM channels"
+SQL_GET_CHANNELS_BY_OWNER = "SELECT chat_id, username, owner_user_id, moderation, reviewers_mode FROM channels WHERE owner_user_id=? ORDER BY chat_id"
+SQL_SET_MODERATION = "UPDATE channels SET moderation=? WHERE chat_id=?"
+SQL_SET_REVIEWERS_MODE = "UPDATE channels SET reviewers_mode=? WHERE chat_id=?"
+SQL_ADD_REVIEWER = "INSERT OR IGNORE INTO channel_reviewers(chat_id, user_id, created_at) VALUES(?, ?, ?)"
+SQL_REMOVE_REVIEWER = "DELETE FROM channel_reviewers WHERE chat_id=? AND user_id=?"
+SQL_GET_REVIEWERS = "SELECT user_id FROM channel_reviewers WHERE chat_id=?"
+SQL_CREATE_DEEPLINK = """
+INSERT INTO deeplinks(code, chat_id, created_at) VALUES(?, ?, ?)
+ON CONFLICT(code) DO UPDATE SET chat_id=excluded.chat_id
+RETURNING chat_id
+"""
+SQL_RESOLVE_DEEPLINK = "SELECT chat_id FROM deeplinks WHERE code=?"
+SQL_INSERT_SUBMISSION = "INSERT INTO submissions(chat_id, sender_user_id, content_type, text, file_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_GET_SUBMISSION = "SELECT id, chat_id, sender_user_id, content_type, text, file_id, status FROM submissions WHERE id=?"
+SQL_SET_SUBMISSION_STATUS = "UPDATE submissions SET status=? WHERE id=?"
+SQL_LIST_PENDING = """
+SELECT id, content_type, substr(COALESCE(text,''), 1, 31) as text,  -- кнопке хватает 30 символов + признак «длиннее»
+       (SELECT COUNT(*) FROM submissions WHERE chat_id=?1 AND status=?2) as total
+FROM submissions
+WHERE chat_id=?1 AND status=?2
+ORDER BY id DESC
+LIMIT ?3 OFFSET ?4
+"""
+
+# та же страница, что у SQL_LIST_PENDING, но с file_id — для превью альбомами
+SQL_LIST_PENDING_MEDIA = """
+SELECT id, content_type, COALESCE(text,'') as text, file_id
+FROM submissions
+WHERE chat_id=? AND status=?
+ORDER BY id DESC
+LIMIT ? OFFSET ?
+"""
 
 # ---- consent helpers ----
 async def get_user_consent(user_id: int) -> Optional[Tuple[int, str]]:
     """returns (accepted, policy_hash) or None"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT accepted, policy_hash FROM user_consents WHERE user_id=?",
-            (user_id,),
-        ) as cur:
-            row = await cur.fetchone()
-            return (int(row[0]), str(row[1])) if row else None
-
-async def set_user_consent(user_id: int, accepted: int, policy_hash: str):
-    now = dt.datetime.now(dt.UTC).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-        INSERT INTO user_consents(user_id, accepted, policy_hash, accepted_at)
-        VALUES(?, ?, ?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET
-            accepted=excluded.accepted,
-            policy_hash=excluded.policy_hash,
-            accepted_at=excluded.accepted_at
-        """, (user_id, accepted, policy_hash, now))
-        await db.commit()
+    rows = await DB.execute_fetchall(SQL_GET_CONSENT, (user_id,))
+    return (int(rows[0][0]), str(rows[0][1])) if rows else None
+
+# user_id, принявшие текущую POLICY_HASH (в этом процессе). При смене политики
+# процесс перезапускается с пустым множеством, так что старые согласия не проскочат.
+ACCEPTED_USERS: Set[int] = set()
+
+async def set_user_consent(user_id: int, accepted: int, policy_hash: str) -> Tuple[int, str]:
+    """returns stored (accepted, policy_hash)"""
+    async with DB_WRITE_LOCK:
+        rows = await DB.execute_fetchall(SQL_SET_CONSENT, (user_id, accepted, policy_hash, now_iso()))
+        await DB.commit()
+    stored = int(rows[0][0]), str(rows[0][1])
+    if stored == (1, POLICY_HASH):
+        ACCEPTED_USERS.add(user_id)
+    else:
+        ACCEPTED_USERS.discard(user_id)
+    return stored
 
 async def user_is_allowed(user_id: int) -> bool:
+    if user_id in ACCEPTED_USERS:
+        return True
     row = await get_user_consent(user_id)
     if not row:
         return False
     accepted, ph = row
     # если политика обновилась — потребуется принять заново
-    return accepted == 1 and ph == POLICY_HASH
+    if accepted == 1 and ph == POLICY_HASH:
+        ACCEPTED_USERS.add(user_id)
+        return True
+    return False
 
 # ---- channels/submissions helpers ----
+# Строки каналов и списки проверяющих меняет только этот процесс,
+# поэтому кэш просто сбрасывается в функциях записи.
+CHANNEL_CACHE: Dict[int, Any] = {}
+CHANNEL_OWNER: Dict[int, int] = {}  # chat_id -> owner_user_id для всех каналов, грузится при старте
+REVIEWERS_CACHE: Dict[int, FrozenSet[int]] = {}
+
 async def upsert_channel(chat_id: int, username: Optional[str], owner_user_id: int, moderation: int = 1):
-    now = dt.datetime.now(dt.UTC).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-        INSERT INTO channels(chat_id, username, owner_user_id, moderation, reviewers_mode, created_at)
-        VALUES(?, ?, ?, ?, 'owner', ?)
-        ON CONFLICT(chat_id) DO UPDATE SET
-            username=excluded.username,
-            owner_user_id=excluded.owner_user_id
-        """, (chat_id, username, owner_user_id, moderation, now))
-        await db.commit()
+    async with DB_WRITE_LOCK:
+        await DB.execute(SQL_UPSERT_CHANNEL, (chat_id, username, owner_user_id, moderation, now_iso()))
+        await DB.commit()
+    CHANNEL_CACHE.pop(chat_id, None)
+    CHANNEL_OWNER[chat_id] = owner_user_id
 
 async def get_channel_by_chat_id(chat_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT chat_id, username, owner_user_id, moderation, reviewers_mode FROM channels WHERE chat_id=?",
-            (chat_id,),
-        ) as cur:
-            return await cur.fetchone()
+    row = CHANNEL_CACHE.get(chat_id)
+    if row is not None:
+        return row
+    rows = await DB.execute_fetchall(SQL_GET_CHANNEL, (chat_id,))
+    if not rows:
+        return None
+    CHANNEL_CACHE[chat_id] = rows[0]
+    return rows[0]
 
 async def get_channels_by_owner(owner_user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT chat_id, username, owner_user_id, moderation, reviewers_mode FROM channels WHERE owner_user_id=? ORDER BY chat_id",
-            (owner_user_id,),
-        ) as cur:
-            return await cur.fetchall()
+    rows = await DB.execute_fetchall(SQL_GET_CHANNELS_BY_OWNER, (owner_user_id,))
+    # те же колонки, что у SQL_GET_CHANNEL: следующий ch_open возьмёт строку из кэша
+    for row in rows:
+        CHANNEL_CACHE[row[0]] = row
+    return rows
 
 async def set_channel_moderation(chat_id: int, moderation: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE channels SET moderation=? WHERE chat_id=?", (moderation, chat_id))
-        await db.commit()
+    async with DB_WRITE_LOCK:
+        await DB.execute(SQL_SET_MODERATION, (moderation, chat_id))
+        await DB.commit()
+    CHANNEL_CACHE.pop(chat_id, None)
 
 async def set_reviewers_mode(chat_id: int, mode: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE channels SET reviewers_mode=? WHERE chat_id=?", (mode, chat_id))
-        await db.commit()
-
-async def add_reviewer(chat_id: int, user_id: int):
-    now = dt.datetime.now(dt.UTC).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO channel_reviewers(chat_id, user_id, created_at) VALUES(?, ?, ?)",
-            (chat_id, user_id, now),
-        )
-        await db.commit()
-
-async def remove_reviewer(chat_id: int, user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM channel_reviewers WHERE chat_id=? AND user_id=?", (chat_id, user_id))
-        await db.commit()
+    async with DB_WRITE_LOCK:
+        await DB.execute(SQL_SET_REVIEWERS_MODE, (mode, chat_id))
+        await DB.commit()
+    CHANNEL_CACHE.pop(chat_id, None)
+
+async def _write_reviewers(chat_id: int, sql: str, params: tuple) -> List[int]:
+    """Запись и перечитывание списка в одной транзакции: кэш сразу получает свежий список."""
+    async with DB_WRITE_LOCK:
+        await DB.execute(sql, params)
+        rows = await DB.execute_fetchall(SQL_GET_REVIEWERS, (chat_id,))
+        await DB.commit()
+    ids = frozenset(int(r[0]) for r in rows)
+    REVIEWERS_CACHE[chat_id] = ids
+    return sorted(ids)
+
+async def add_reviewer(chat_id: int, user_id: int) -> List[int]:
+    """returns обновлённый список проверяющих"""
+    return await _write_reviewers(chat_id, SQL_ADD_REVIEWER, (chat_id, user_id, now_iso()))
+
+async def remove_reviewer(chat_id: int, user_id: int) -> List[int]:
+    """returns обновлённый список проверяющих"""
+    return await _write_reviewers(chat_id, SQL_REMOVE_REVIEWER, (chat_id, user_id))
+
+async def get_reviewer_ids(chat_id: int) -> FrozenSet[int]:
+    ids = REVIEWERS_CACHE.get(chat_id)
+    if ids is not None:
+        return ids
+    rows = await DB.execute_fetchall(SQL_GET_REVIEWERS, (chat_id,))
+    ids = frozenset(int(r[0]) for r in rows)
+    REVIEWERS_CACHE[chat_id] = ids
+    return ids
 
 async def list_reviewers(chat_id: int) -> List[int]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT user_id FROM channel_reviewers WHERE chat_id=? ORDER BY user_id",
-            (chat_id,),
-        ) as cur:
-            rows = await cur.fetchall()
-            return [int(r[0]) for r in rows]
-
-async def create_deeplink(code: str, chat_id: int):
-    now = dt.datetime.now(dt.UTC).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO deeplinks(code, chat_id, created_at) VALUES(?, ?, ?)",
-            (code, chat_id, now),
-        )
-        await db.commit()
+    return sorted(await get_reviewer_ids(chat_id))
+
+async def create_deeplink(code: str, chat_id: int) -> int:
+    """returns chat_id, на который теперь указывает code"""
+    async with DB_WRITE_LOCK:
+        rows = await DB.execute_fetchall(SQL_CREATE_DEEPLINK, (code, chat_id, now_iso()))
+        await DB.commit()
+    return int(rows[0][0])
 
 async def resolve_deeplink(code: str) -> Optional[int]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT chat_id FROM deeplinks WHERE code=?", (code,)) as cur:
-            row = await cur.fetchone()
-            return int(row[0]) if row else None
+    rows = await DB.execute_fetchall(SQL_RESOLVE_DEEPLINK, (code,))
+    return int(rows[0][0]) if rows else None
 
 async def create_submission(
     chat_id: int,
@@ -333,90 +524,87 @@ async def create_submission(
     file_id: Optional[str],
     status: str,
 ) -> int:
-    now = dt.datetime.now(dt.UTC).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("""
-        INSERT INTO submissions(chat_id, sender_user_id, content_type, text, file_id, status, created_at)
-        VALUES(?, ?, ?, ?, ?, ?, ?)
-        """, (chat_id, sender_user_id, content_type, text, file_id, status, now))
-        await db.commit()
-        return cur.lastrowid
+    async with DB_WRITE_LOCK:
+        row = await DB.execute_insert(SQL_INSERT_SUBMISSION, (chat_id, sender_user_id, content_type, text, file_id, status, now_iso()))
+        await DB.commit()
+    return int(row[0])
 
 async def get_submission(sub_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-        SELECT id, chat_id, sender_user_id, content_type, text, file_id, status
-        FROM submissions WHERE id=?
-        """, (sub_id,)) as cur:
-            return await cur.fetchone()
+    rows = await DB.execute_fetchall(SQL_GET_SUBMISSION, (sub_id,))
+    return rows[0] if rows else None
 
 async def set_submission_status(sub_id: int, status: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE submissions SET status=? WHERE id=?", (status, sub_id))
-        await db.commit()
-
-async def list_pending_submissions(chat_id: int, limit: int = 10, offset: int = 0):
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT id, content_type, COALESCE(text,'') as text
-            FROM submissions
-            WHERE chat_id=? AND status=?
-            ORDER BY id DESC
-            LIMIT ? OFFSET ?
-        """, (chat_id, STATUS_PENDING, limit, offset)) as cur:
-            return await cur.fetchall()
-
-async def count_pending_submissions(chat_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT COUNT(*) FROM submissions WHERE chat_id=? AND status=?
-        """, (chat_id, STATUS_PENDING)) as cur:
-            row = await cur.fetchone()
-            return int(row[0] or 0)
+    async with DB_WRITE_LOCK:
+        await DB.execute(SQL_SET_SUBMISSION_STATUS, (status, sub_id))
+        await DB.commit()
+
+async def list_pending_submissions(chat_id: int, limit: int = 10, offset: int = 0) -> Tuple[tuple, int, int]:
+    """
+    Страница pending-заявок и их общее число за один запрос.
+    returns (items, total, offset); если страница опустела — откатываемся на первую.
+    """
+    rows = await DB.execute_fetchall(SQL_LIST_PENDING, (chat_id, STATUS_PENDING, limit, offset))
+    if not rows and offset > 0:
+        offset = 0
+        rows = await DB.execute_fetchall(SQL_LIST_PENDING, (chat_id, STATUS_PENDING, limit, offset))
+    total = int(rows[0][3]) if rows else 0
+    return tuple(r[:3] for r in rows), total, offset
+
+async def list_pending_media(chat_id: int, limit: int = 10, offset: int = 0):
+    """Медиа-заявки страницы очереди: (id, content_type, text, file_id)."""
+    rows = await DB.execute_fetchall(SQL_LIST_PENDING_MEDIA, (chat_id, STATUS_PENDING, limit, offset))
+    return [r for r in rows if r[1] != "text"]
 
 # ----------------- HELPERS -----------------
-CHANNEL_INPUT_RE = re.compile(r"^@?[A-Za-z0-9_]{5,}$|^-100\d{5,}$")
-
-def normalize_channel_input(s: str) -> str:
-    s = s.strip()
-    if s.startswith("@"):
-        return s
-    if s.isdigit() or (s.startswith("-") and s[1:].isdigit()):
-        return s
-    if re.fullmatch(r"[A-Za-z0-9_]{5,}", s):
-        return "@" + s
-    return s
+# один проход: либо числовой id (-100... или просто цифры), либо username с/без @
+CHANNEL_INPUT_RE = re.compile(r"^(?:(?P<id>-100\d{5,}|\d{5,})|@?(?P<name>[A-Za-z0-9_]{5,}))$")
 
+def normalize_channel_input(s: str) -> Optional[str]:
+    """Возвращает @username или chat_id в каноничном виде, либо None если формат неверный."""
+    m = CHANNEL_INPUT_RE.match(s.strip())
+    if not m:
+        return None
+    return m.group("id") or "@" + m.group("name")
+
+_SALT_BYTES = DEEPLINK_SALT.encode("utf-8")
+
+@functools.lru_cache(maxsize=4096)
 def make_code_for_chat(chat_id: int) -> str:
-    raw = f"{chat_id}:{DEEPLINK_SALT}".encode("utf-8")
-    digest = hashlib.sha256(raw).digest()
+    digest = hashlib.sha256(str(chat_id).encode("ascii") + b":" + _SALT_BYTES).digest()
     b32 = base64.b32encode(digest).decode("ascii").rstrip("=")
     return b32[:20]
 
 # ----------------- UI -----------------
-def main_menu():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("📨 Отправить", callback_data="menu_send")],
-        [InlineKeyboardButton("🛠 Контролировать", callback_data="menu_control")],
-        [InlineKeyboardButton("📜 Правила и анонимность", callback_data="menu_policy")],
-    ])
-
-def back_to_menu():
-    return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")]])
-
-def send_menu():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔗 Ввести канал", callback_data="send_pick_channel")],
-        [InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")],
-    ])
-
-def control_menu():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("➕ Привязать канал", callback_data="ctl_bind")],
-        [InlineKeyboardButton("📋 Мои каналы", callback_data="ctl_list")],
-        [InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")],
-    ])
-
+# Шаблоны callback_data для отдельных хэндлеров: PTB вызывает re.match(pattern, data) на каждый
+# callback, скомпилированный Pattern не ищется в кэше модуля re. Всё прочее — MENU_ACTIONS в on_menu.
+POLICY_CB_RE = re.compile(r"^(?:policy_accept|policy_decline)$")
+SEND_CB_RE = re.compile(r"^(?:send_confirm|send_cancel)$")
+MOD_CB_RE = re.compile(r"^mod_(?P<act>ok|no):(?P<sid>-?\d+)$")
+
+# Статические клавиатуры собираем один раз (объекты PTB неизменяемы, их можно переиспользовать).
+MAIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📨 Отправить", callback_data="menu_send")],
+    [InlineKeyboardButton("🛠 Контролировать", callback_data="menu_control")],
+    [InlineKeyboardButton("📜 Правила и анонимность", callback_data="menu_policy")],
+])
+
+BACK_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")]])
+
+SEND_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔗 Ввести канал", callback_data="send_pick_channel")],
+    [InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")],
+])
+
+CONTROL_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Привязать канал", callback_data="ctl_bind")],
+    [InlineKeyboardButton("📋 Мои каналы", callback_data="ctl_list")],
+    [InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")],
+])
+
+def reviewers_text(reviewers: List[int]) -> str:
+    return "Проверяющие (user_id):\n" + ("\n".join(map(str, reviewers)) if reviewers else "— пусто —")
+
+@functools.lru_cache(maxsize=1024)
 def reviewers_manage_kb(chat_id: int):
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("➕ Добавить user_id", callback_data=f"rv_add:{chat_id}")],
@@ -424,6 +612,7 @@ def reviewers_manage_kb(chat_id: int):
         [InlineKeyboardButton("⬅️ Назад", callback_data=f"ch_open:{chat_id}")],
     ])
 
+@functools.lru_cache(maxsize=1024)
 def channel_controls(chat_id: int, moderation: int, reviewers_mode: str):
     mode_title = {"owner": "Только владелец", "admins": "Все админы", "selected": "Выбранные"}.get(reviewers_mode, reviewers_mode)
     kb = [
@@ -443,12 +632,12 @@ def channel_controls(chat_id: int, moderation: int, reviewers_mode: str):
         kb.insert(3, [InlineKeyboardButton("👥 Управлять проверяющими", callback_data=f"ch_reviewers_manage:{chat_id}")])
     return InlineKeyboardMarkup(kb)
 
-def confirm_send_kb():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ Отправить", callback_data="send_confirm")],
-        [InlineKeyboardButton("❌ Отмена", callback_data="send_cancel")],
-    ])
+CONFIRM_SEND_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Отправить", callback_data="send_confirm")],
+    [InlineKeyboardButton("❌ Отмена", callback_data="send_cancel")],
+])
 
+@functools.lru_cache(maxsize=1024)
 def ticket_kb(sub_id: int):
     return InlineKeyboardMarkup([
         [
@@ -457,12 +646,16 @@ def ticket_kb(sub_id: int):
         ]
     ])
 
-def queue_kb(chat_id: int, items, total: int, offset: int, limit: int = 10):
-    kb = []
-    for sid, ctype, txt in items:
-        preview = (txt[:30] + "…") if len(txt) > 30 else txt
-        label = f"#{sid} | {ctype}" + (f" | {preview}" if preview else "")
-        kb.append([InlineKeyboardButton(label, callback_data=f"q_open:{chat_id}:{sid}")])
+@functools.lru_cache(maxsize=256)
+def queue_kb(chat_id: int, items: tuple, total: int, offset: int, limit: int = 10):
+    # items — кортеж строк (id, content_type, text[:31]): одна и та же страница отдаёт тот же объект клавиатуры
+    kb = [
+        [InlineKeyboardButton(
+            f"#{sid} | {ctype} | {txt[:30]}…" if len(txt) > 30 else (f"#{sid} | {ctype} | {txt}" if txt else f"#{sid} | {ctype}"),
+            callback_data=f"q_open:{chat_id}:{sid}",
+        )]
+        for sid, ctype, txt in items
+    ]
 
     nav = []
     if offset > 0:
@@ -472,19 +665,18 @@ def queue_kb(chat_id: int, items, total: int, offset: int, limit: int = 10):
     if nav:
         kb.append(nav)
 
+    if any(ctype != "text" for _, ctype, _ in items):
+        kb.append([InlineKeyboardButton("🖼 Превью медиа страницы", callback_data=f"q_preview:{chat_id}:{offset}")])
+
     kb.append([InlineKeyboardButton("⬅️ Назад", callback_data=f"ch_open:{chat_id}")])
     return InlineKeyboardMarkup(kb)
 
-def policy_kb():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ Принять и продолжить", callback_data="policy_accept")],
-        [InlineKeyboardButton("❌ Отказаться и выйти", callback_data="policy_decline")],
-    ])
+POLICY_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Принять и продолжить", callback_data="policy_accept")],
+    [InlineKeyboardButton("❌ Отказаться и выйти", callback_data="policy_decline")],
+])
 
-def policy_back_kb():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("⬅️ В меню", callback_data="menu_back")]
-    ])
+POLICY_BACK_KB = BACK_MENU
 
 # ----------------- Permissions -----------------
 async def verify_bind(
@@ -525,14 +717,47 @@ async def verify_bind(
 
 async def ensure_registered_channel(context: ContextTypes.DEFAULT_TYPE, channel_input: str) -> Optional[int]:
     """Send allowed only into registered channels."""
+    # числовой chat_id уже привязанного канала — без запроса к Telegram и БД
+    if channel_input.lstrip("-").isdigit() and int(channel_input) in CHANNEL_OWNER:
+        return int(channel_input)
     try:
         chat = await context.bot.get_chat(channel_input)
-        row = await get_channel_by_chat_id(chat.id)
-        return chat.id if row else None
+        return chat.id if chat.id in CHANNEL_OWNER else None
     except Exception:
         return None
 
+def is_channel_owner(chat_id: int, user_id: int) -> bool:
+    """Проверка владельца по CHANNEL_OWNER — без обращения к БД."""
+    return CHANNEL_OWNER.get(chat_id) == user_id
+
+# Статус админа канала (get_chat_member) — единственная сетевая проверка в can_moderate;
+# листание очереди дёргает её на каждый клик, поэтому держим ответ ADMIN_CACHE_TTL секунд.
+ADMIN_CACHE_MAX = 4096
+ADMIN_CACHE_TTL = 60.0
+ADMIN_CACHE: OrderedDict[Tuple[int, int], Tuple[float, bool]] = OrderedDict()  # (chat_id, uid) -> (expires, is_admin)
+
+async def is_channel_admin(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> bool:
+    key = (chat_id, user_id)
+    hit = ADMIN_CACHE.get(key)
+    now = time.monotonic()
+    if hit is not None and hit[0] > now:
+        ADMIN_CACHE.move_to_end(key)
+        return hit[1]
+    try:
+        m = await context.bot.get_chat_member(chat_id, user_id)
+    except Exception:
+        return False  # сетевые ошибки не кэшируем
+    ok = m.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    ADMIN_CACHE[key] = (now + ADMIN_CACHE_TTL, ok)
+    ADMIN_CACHE.move_to_end(key)
+    if len(ADMIN_CACHE) > ADMIN_CACHE_MAX:
+        ADMIN_CACHE.popitem(last=False)
+    return ok
+
 async def can_moderate(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> bool:
+    if is_channel_owner(chat_id, user_id):
+        return True
+
     row = await get_channel_by_chat_id(chat_id)
     if not row:
         return False
@@ -546,34 +771,48 @@ async def can_moderate(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id
         return False
 
     if reviewers_mode == "selected":
-        reviewers = await list_reviewers(chat_id)
-        return user_id in reviewers
+        return user_id in await get_reviewer_ids(chat_id)
 
     if reviewers_mode == "admins":
-        try:
-            m = await context.bot.get_chat_member(chat_id, user_id)
-            return m.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
-        except Exception:
-            return False
+        return await is_channel_admin(context, chat_id, user_id)
 
     return False
 
 # ----------------- STATE (in-memory) -----------------
-USER_STATE: Dict[int, Dict[str, Any]] = {}
+@dataclass(slots=True)
+class UserState:
+    mode: Optional[str] = None              # send_pick_channel | send_wait_content | ctl_bind_wait | rv_add_wait | rv_del_wait
+    selected_chat_id: Optional[int] = None
+    pending: Optional[Dict[str, Any]] = None  # dict(content_type,text,file_id)
+    rv_chat_id: Optional[int] = None
+
+USER_STATE_MAX = 50_000
+USER_STATE: OrderedDict[int, UserState] = OrderedDict()  # LRU: давно неактивные вытесняются
+
+def st(uid: int) -> UserState:
+    s = USER_STATE.get(uid)
+    if s is None:
+        s = USER_STATE[uid] = UserState()
+        if len(USER_STATE) > USER_STATE_MAX:
+            USER_STATE.popitem(last=False)
+    else:
+        USER_STATE.move_to_end(uid)
+    return s
 
-def st(uid: int) -> Dict[str, Any]:
-    return USER_STATE.setdefault(uid, {
-        "mode": None,               # send_pick_channel | send_wait_content | ctl_bind_wait | rv_add_wait | rv_del_wait
-        "selected_chat_id": None,   # int
-        "pending": None,            # dict(content_type,text,file_id)
-        "rv_chat_id": None,         # int
-    })
+def reap_state(uid: int):
+    """Состояние без единого поля не держим: память занимают только пользователи посреди сценария."""
+    s = USER_STATE.get(uid)
+    if s is not None and s.mode is None and s.selected_chat_id is None and s.pending is None and s.rv_chat_id is None:
+        del USER_STATE[uid]
 
 def reset_send(uid: int):
-    s = st(uid)
-    s["mode"] = None
-    s["selected_chat_id"] = None
-    s["pending"] = None
+    s = USER_STATE.get(uid)
+    if s is None:
+        return
+    s.mode = None
+    s.selected_chat_id = None
+    s.pending = None
+    reap_state(uid)
 
 # ----------------- Consent gate -----------------
 async def ensure_consent_or_show(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -588,7 +827,11 @@ async def ensure_consent_or_show(update: Update, context: ContextTypes.DEFAULT_T
     if await user_is_allowed(uid):
         return True
 
-    # показать политику
+    await show_policy_prompt(update)
+    return False
+
+async def show_policy_prompt(update: Update):
+    """Показывает политику с кнопками Принять/Отказаться."""
     target = None
     if update.message:
         target = update.message
@@ -597,46 +840,56 @@ async def ensure_consent_or_show(update: Update, context: ContextTypes.DEFAULT_T
 
     if target:
         # Если политика обновилась — это тоже сюда попадёт
-        try:
-            await target.reply_text(
-                POLICY_TEXT,
-                parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=policy_kb(),
-                disable_web_page_preview=True,
-            )
-        except Exception as e:
-            # fallback без markdown если файл сломан
-            await target.reply_text(
-                "Не могу отобразить политику (ошибка форматирования MarkdownV2). "
-                "Проверь privacy_anon.md.\n\n"
-                f"Тех. ошибка: {e}"
-            )
-    return False
+        await send_policy(target.reply_text, POLICY_KB)
+
+async def send_policy(send, reply_markup: InlineKeyboardMarkup):
+    """send — target.reply_text или q.edit_message_text."""
+    global POLICY_PARSE_MODE
+    try:
+        await send(
+            POLICY_TEXT,
+            parse_mode=POLICY_PARSE_MODE,
+            reply_markup=reply_markup,
+            disable_web_page_preview=True,
+        )
+    except BadRequest as e:
+        if POLICY_PARSE_MODE is None or "parse entities" not in str(e).lower():
+            raise
+        # проверка при старте пропустила ошибку — дальше шлём без разметки, не тратя лишний запрос
+        logger.warning("privacy_anon.md не парсится как MarkdownV2 (%s), показываю без разметки", e)
+        POLICY_PARSE_MODE = None
+        await send(POLICY_TEXT, reply_markup=reply_markup, disable_web_page_preview=True)
 
 # ----------------- Update log (minimal) -----------------
 async def log_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.debug("Update received")
 
 # ----------------- Core actions -----------------
+# content_type -> отправка медиа; всё остальное уходит как текст
+MEDIA_SENDERS = {
+    "photo": lambda bot, chat_id, fid, **kw: bot.send_photo(chat_id, fid, **kw),
+    "video": lambda bot, chat_id, fid, **kw: bot.send_video(chat_id, fid, **kw),
+    "document": lambda bot, chat_id, fid, **kw: bot.send_document(chat_id, fid, **kw),
+    "audio": lambda bot, chat_id, fid, **kw: bot.send_audio(chat_id, fid, **kw),
+    "voice": lambda bot, chat_id, fid, **kw: bot.send_voice(chat_id, fid, **kw),
+}
+
+async def send_content(context: ContextTypes.DEFAULT_TYPE, chat_id: int, ctype: str, fid: Optional[str], text: str, reply_markup=None):
+    send_media = MEDIA_SENDERS.get(ctype)
+    if send_media is None:
+        return await context.bot.send_message(chat_id, text, reply_markup=reply_markup)
+    return await send_media(context.bot, chat_id, fid, caption=text if text else None, reply_markup=reply_markup)
+
+async def notify_user(context: ContextTypes.DEFAULT_TYPE, user_id: int, text: str):
+    """Служебное сообщение пользователю; если он заблокировал бота — молча пропускаем."""
+    try:
+        await context.bot.send_message(user_id, text)
+    except Exception:
+        pass
+
 async def post_to_channel(context: ContextTypes.DEFAULT_TYPE, chat_id: int, pending: Dict[str, Any]):
-    ctype = pending["content_type"]
     text = (pending.get("text") or "").strip()
-    fid = pending.get("file_id")
-
-    if ctype == "text":
-        await context.bot.send_message(chat_id, text)
-    elif ctype == "photo":
-        await context.bot.send_photo(chat_id, fid, caption=text if text else None)
-    elif ctype == "video":
-        await context.bot.send_video(chat_id, fid, caption=text if text else None)
-    elif ctype == "document":
-        await context.bot.send_document(chat_id, fid, caption=text if text else None)
-    elif ctype == "audio":
-        await context.bot.send_audio(chat_id, fid, caption=text if text else None)
-    elif ctype == "voice":
-        await context.bot.send_voice(chat_id, fid, caption=text if text else None)
-    else:
-        await context.bot.send_message(chat_id, text)
+    await send_content(context, chat_id, pending["content_type"], pending.get("file_id"), text)
 
 async def send_ticket_to_owner(context: ContextTypes.DEFAULT_TYPE, owner_user_id: int, sub_id: int, pending: Dict[str, Any]):
     text_preview = (pending.get("text") or "").strip()
@@ -647,23 +900,52 @@ async def send_ticket_to_owner(context: ContextTypes.DEFAULT_TYPE, owner_user_id
         header += f"\n\nТекст/подпись:\n{text_preview}"
 
     try:
-        if ctype == "text":
-            await context.bot.send_message(owner_user_id, header, reply_markup=ticket_kb(sub_id))
-        elif ctype == "photo":
-            await context.bot.send_photo(owner_user_id, pending["file_id"], caption=header, reply_markup=ticket_kb(sub_id))
-        elif ctype == "video":
-            await context.bot.send_video(owner_user_id, pending["file_id"], caption=header, reply_markup=ticket_kb(sub_id))
-        elif ctype == "document":
-            await context.bot.send_document(owner_user_id, pending["file_id"], caption=header, reply_markup=ticket_kb(sub_id))
-        elif ctype == "audio":
-            await context.bot.send_audio(owner_user_id, pending["file_id"], caption=header, reply_markup=ticket_kb(sub_id))
-        elif ctype == "voice":
-            await context.bot.send_voice(owner_user_id, pending["file_id"], caption=header, reply_markup=ticket_kb(sub_id))
-        else:
-            await context.bot.send_message(owner_user_id, header, reply_markup=ticket_kb(sub_id))
+        await send_content(context, owner_user_id, ctype, pending.get("file_id"), header, reply_markup=ticket_kb(sub_id))
     except Exception:
         pass
 
+# Что Telegram разрешает смешивать в одном альбоме; voice в sendMediaGroup не бывает
+MEDIA_GROUP_INPUT = {
+    "photo": ("visual", InputMediaPhoto),
+    "video": ("visual", InputMediaVideo),
+    "document": ("document", InputMediaDocument),
+    "audio": ("audio", InputMediaAudio),
+}
+MEDIA_GROUP_MAX = 10
+
+async def send_ticket_previews(context: ContextTypes.DEFAULT_TYPE, user_id: int, rows) -> int:
+    """
+    Превью медиа-заявок альбомами: до 10 штук на один sendMediaGroup вместо запроса на каждую.
+    rows: (id, content_type, text, file_id). returns сколько превью отправлено.
+    """
+    groups: Dict[str, List[Tuple[str, str, str]]] = {}
+    singles: List[Tuple[str, str, str]] = []
+    for sid, ctype, text, fid in rows:
+        caption = f"#{sid} | {ctype}" + (f"\n{text[:900]}" if text else "")
+        kind = MEDIA_GROUP_INPUT.get(ctype, (None,))[0]
+        (groups.setdefault(kind, []) if kind else singles).append((ctype, fid, caption))
+
+    sent = 0
+    for items in groups.values():
+        for i in range(0, len(items), MEDIA_GROUP_MAX):
+            chunk = items[i:i + MEDIA_GROUP_MAX]
+            if len(chunk) == 1:
+                singles.extend(chunk)  # альбом из одного элемента Telegram не принимает
+                continue
+            media = [MEDIA_GROUP_INPUT[ctype][1](fid, caption=caption) for ctype, fid, caption in chunk]
+            try:
+                await context.bot.send_media_group(user_id, media)
+                sent += len(chunk)
+            except Exception:
+                pass
+    for ctype, fid, caption in singles:
+        try:
+            await send_content(context, user_id, ctype, fid, caption)
+            sent += 1
+        except Exception:
+            pass
+    return sent
+
 # ----------------- ERROR HANDLER -----------------
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
     logger.exception("Unhandled exception", exc_info=context.error)
@@ -678,25 +960,32 @@ async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
 
 # ----------------- Handlers -----------------
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # gate
-    if not await ensure_consent_or_show(update, context):
+    if not update.effective_user:
         return
 
     uid = update.effective_user.id
     code = context.args[0].strip() if context.args else ""
 
+    # gate + deeplink: оба запроса уходят в БД сразу, без ожидания друг друга
     if code:
-        chat_id = await resolve_deeplink(code)
-        if chat_id:
-            s = st(uid)
-            s["selected_chat_id"] = chat_id
-            await update.message.reply_text(
-                "Канал выбран по ссылке. Нажми «Отправить».",
-                reply_markup=main_menu()
-            )
-            return
+        allowed, chat_id = await asyncio.gather(user_is_allowed(uid), resolve_deeplink(code))
+    else:
+        allowed, chat_id = await user_is_allowed(uid), None
+
+    if not allowed:
+        await show_policy_prompt(update)
+        return
 
-    await update.message.reply_text("Меню:", reply_markup=main_menu())
+    if chat_id:
+        s = st(uid)
+        s.selected_chat_id = chat_id
+        await update.message.reply_text(
+            "Канал выбран по ссылке. Нажми «Отправить».",
+            reply_markup=MAIN_MENU
+        )
+        return
+
+    await update.message.reply_text("Меню:", reply_markup=MAIN_MENU)
 
 async def on_policy_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
@@ -706,274 +995,279 @@ async def on_policy_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     if data == "policy_accept":
         await set_user_consent(uid, 1, POLICY_HASH)
-        await event_log(context, "Пользователь принял политику (без идентификации).")
+        event_log(context, "Пользователь принял политику (без идентификации).")
         try:
-            await q.edit_message_text("✅ Принято. Продолжаем.", reply_markup=main_menu())
+            await q.edit_message_text("✅ Принято. Продолжаем.", reply_markup=MAIN_MENU)
         except Exception:
-            await q.message.reply_text("✅ Принято. Продолжаем.", reply_markup=main_menu())
+            await q.message.reply_text("✅ Принято. Продолжаем.", reply_markup=MAIN_MENU)
         return
 
     if data == "policy_decline":
         await set_user_consent(uid, 0, POLICY_HASH)
-        await event_log(context, "Пользователь отказался от политики (без идентификации).")
+        event_log(context, "Пользователь отказался от политики (без идентификации).")
         try:
             await q.edit_message_text("❌ Ок. Для использования бота нужно принять политику.")
         except Exception:
             await q.message.reply_text("❌ Ок. Для использования бота нужно принять политику.")
         return
 
-async def on_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # gate (кроме кнопок политики)
-    if not await ensure_consent_or_show(update, context):
-        return
+# ---- on_menu actions: (q, context, uid, payload) ----
+async def cb_menu_back(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    reset_send(uid)
+    await q.edit_message_text("Меню:", reply_markup=MAIN_MENU)
+
+async def cb_menu_policy(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    # показать политику с кнопкой назад
+    await send_policy(q.edit_message_text, POLICY_BACK_KB)
+
+async def cb_menu_send(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    await q.edit_message_text(
+        "Отправка анонимного сообщения.\n"
+        "Если ты зашёл по ссылке канала — он уже выбран.\n"
+        "Иначе нажми «Ввести канал».",
+        reply_markup=SEND_MENU
+    )
 
-    q = update.callback_query
-    await q.answer()
-    uid = q.from_user.id
-    data = q.data
+async def cb_send_pick_channel(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    s = st(uid)
+    s.mode = "send_pick_channel"
+    await q.edit_message_text(
+        "Введи @username канала или chat_id (-100...).\n"
+        "Канал должен быть предварительно привязан владельцем через «Контролировать».",
+        reply_markup=BACK_MENU
+    )
 
-    if data == "menu_back":
-        reset_send(uid)
-        await q.edit_message_text("Меню:", reply_markup=main_menu())
-        return
+async def cb_menu_control(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    await q.edit_message_text("Контроль:", reply_markup=CONTROL_MENU)
 
-    if data == "menu_policy":
-        # показать политику с кнопкой назад
-        try:
-            await q.edit_message_text(
-                POLICY_TEXT,
-                parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=policy_back_kb(),
-                disable_web_page_preview=True,
-            )
-        except Exception as e:
-            await q.edit_message_text(
-                "Не могу отобразить политику (ошибка форматирования MarkdownV2). "
-                "Проверь privacy_anon.md.\n\n"
-                f"Тех. ошибка: {e}",
-                reply_markup=policy_back_kb(),
-            )
-        return
+async def cb_ctl_bind(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    s = st(uid)
+    s.mode = "ctl_bind_wait"
+    await q.edit_message_text(
+        "Привязка канала.\n"
+        "Введи @username канала или chat_id (-100...).\n\n"
+        "Требования:\n"
+        "• бот админ канала\n"
+        "• привязать может только creator (владелец)\n",
+        reply_markup=BACK_MENU
+    )
 
-    if data == "menu_send":
-        await q.edit_message_text(
-            "Отправка анонимного сообщения.\n"
-            "Если ты зашёл по ссылке канала — он уже выбран.\n"
-            "Иначе нажми «Ввести канал».",
-            reply_markup=send_menu()
-        )
+async def cb_ctl_list(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    channels = await get_channels_by_owner(uid)
+    if not channels:
+        await q.edit_message_text("У тебя нет привязанных каналов.", reply_markup=CONTROL_MENU)
         return
 
-    if data == "send_pick_channel":
-        s = st(uid)
-        s["mode"] = "send_pick_channel"
-        await q.edit_message_text(
-            "Введи @username канала или chat_id (-100...).\n"
-            "Канал должен быть предварительно привязан владельцем через «Контролировать».",
-            reply_markup=back_to_menu()
-        )
+    kb = []
+    for chat_id, username, _, moderation, reviewers_mode in channels:
+        title = f"@{username}" if username else str(chat_id)
+        mode_title = {"owner": "владелец", "admins": "админы", "selected": "выбранные"}.get(reviewers_mode, reviewers_mode)
+        kb.append([InlineKeyboardButton(
+            f"{title} | мод:{'ON' if moderation else 'OFF'} | {mode_title}",
+            callback_data=f"ch_open:{chat_id}"
+        )])
+    kb.append([InlineKeyboardButton("⬅️ Назад", callback_data="menu_control")])
+    await q.edit_message_text("Мои каналы:", reply_markup=InlineKeyboardMarkup(kb))
+
+async def cb_ch_open(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    row = await get_channel_by_chat_id(chat_id)
+    if not row or int(row[2]) != uid:
+        await q.edit_message_text("Нет доступа.", reply_markup=CONTROL_MENU)
         return
 
-    if data == "menu_control":
-        await q.edit_message_text("Контроль:", reply_markup=control_menu())
-        return
+    _, username, _, moderation, reviewers_mode = row
+    title = f"@{username}" if username else str(chat_id)
+    await q.edit_message_text(
+        f"Канал: {title}\nchat_id: {chat_id}",
+        reply_markup=channel_controls(chat_id, moderation, reviewers_mode)
+    )
 
-    if data == "ctl_bind":
-        s = st(uid)
-        s["mode"] = "ctl_bind_wait"
-        await q.edit_message_text(
-            "Привязка канала.\n"
-            "Введи @username канала или chat_id (-100...).\n\n"
-            "Требования:\n"
-            "• бот админ канала\n"
-            "• привязать может только creator (владелец)\n",
-            reply_markup=back_to_menu()
-        )
+async def cb_ch_toggle(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    row = await get_channel_by_chat_id(chat_id)
+    if not row or int(row[2]) != uid:
+        await q.answer("Нет доступа", show_alert=True)
         return
-
-    if data == "ctl_list":
-        channels = await get_channels_by_owner(uid)
-        if not channels:
-            await q.edit_message_text("У тебя нет привязанных каналов.", reply_markup=control_menu())
-            return
-
-        kb = []
-        for chat_id, username, _, moderation, reviewers_mode in channels:
-            title = f"@{username}" if username else str(chat_id)
-            mode_title = {"owner": "владелец", "admins": "админы", "selected": "выбранные"}.get(reviewers_mode, reviewers_mode)
-            kb.append([InlineKeyboardButton(
-                f"{title} | мод:{'ON' if moderation else 'OFF'} | {mode_title}",
-                callback_data=f"ch_open:{chat_id}"
-            )])
-        kb.append([InlineKeyboardButton("⬅️ Назад", callback_data="menu_control")])
-        await q.edit_message_text("Мои каналы:", reply_markup=InlineKeyboardMarkup(kb))
+    _, _, _, moderation, reviewers_mode = row
+    new_val = 0 if int(moderation) == 1 else 1
+    await set_channel_moderation(chat_id, new_val)
+    await q.edit_message_reply_markup(reply_markup=channel_controls(chat_id, new_val, reviewers_mode))
+    await q.answer("Готово")
+    event_log(context, f"Модерация переключена: channel={chat_id}, moderation={new_val}")
+
+async def cb_ch_reviewers_mode(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    row = await get_channel_by_chat_id(chat_id)
+    if not row or int(row[2]) != uid:
+        await q.answer("Только владелец может менять это", show_alert=True)
         return
 
-    if data.startswith("ch_open:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.edit_message_text("Нет доступа.", reply_markup=control_menu())
-            return
+    _, _, _, moderation, reviewers_mode = row
+    order = ["owner", "admins", "selected"]
+    new_mode = order[(order.index(reviewers_mode) + 1) % len(order)]
+    await set_reviewers_mode(chat_id, new_mode)
 
-        _, username, _, moderation, reviewers_mode = row
-        title = f"@{username}" if username else str(chat_id)
-        await q.edit_message_text(
-            f"Канал: {title}\nchat_id: {chat_id}",
-            reply_markup=channel_controls(chat_id, moderation, reviewers_mode)
-        )
-        return
+    await q.edit_message_reply_markup(reply_markup=channel_controls(chat_id, int(moderation), new_mode))
+    await q.answer("Готово")
+    event_log(context, f"Режим проверяющих изменён: channel={chat_id}, mode={new_mode}")
 
-    if data.startswith("ch_toggle:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Нет доступа", show_alert=True)
-            return
-        _, _, _, moderation, reviewers_mode = row
-        new_val = 0 if int(moderation) == 1 else 1
-        await set_channel_moderation(chat_id, new_val)
-        await q.edit_message_reply_markup(reply_markup=channel_controls(chat_id, new_val, reviewers_mode))
-        await q.answer("Готово")
-        await event_log(context, f"Модерация переключена: channel={chat_id}, moderation={new_val}")
+async def cb_ch_reviewers_manage(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    if not is_channel_owner(chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
         return
 
-    if data.startswith("ch_reviewers_mode:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Только владелец может менять это", show_alert=True)
-            return
-
-        _, _, _, moderation, reviewers_mode = row
-        order = ["owner", "admins", "selected"]
-        new_mode = order[(order.index(reviewers_mode) + 1) % len(order)]
-        await set_reviewers_mode(chat_id, new_mode)
+    await q.edit_message_text(reviewers_text(await list_reviewers(chat_id)), reply_markup=reviewers_manage_kb(chat_id))
 
-        await q.edit_message_reply_markup(reply_markup=channel_controls(chat_id, int(moderation), new_mode))
-        await q.answer("Готово")
-        await event_log(context, f"Режим проверяющих изменён: channel={chat_id}, mode={new_mode}")
+async def cb_rv_add(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    if not is_channel_owner(chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
+        return
+    s = st(uid)
+    s.mode = "rv_add_wait"
+    s.rv_chat_id = chat_id
+    await q.edit_message_text("Пришли user_id, которого добавить в проверяющие.", reply_markup=reviewers_manage_kb(chat_id))
+
+async def cb_rv_del(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    if not is_channel_owner(chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
+        return
+    s = st(uid)
+    s.mode = "rv_del_wait"
+    s.rv_chat_id = chat_id
+    await q.edit_message_text("Пришли user_id, которого удалить из проверяющих.", reply_markup=reviewers_manage_kb(chat_id))
+
+async def cb_ch_queue(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    if not await can_moderate(context, chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
         return
 
-    if data.startswith("ch_reviewers_manage:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Нет доступа", show_alert=True)
-            return
+    items, total, offset = await list_pending_submissions(chat_id, limit=10, offset=0)
+    await q.edit_message_text(
+        f"Очередь на проверку (pending): {total}",
+        reply_markup=queue_kb(chat_id, items, total, offset=offset)
+    )
 
-        reviewers = await list_reviewers(chat_id)
-        txt = "Проверяющие (user_id):\n" + ("\n".join(map(str, reviewers)) if reviewers else "— пусто —")
-        await q.edit_message_text(txt, reply_markup=reviewers_manage_kb(chat_id))
+async def cb_q_page(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id_s, _, offset_s = payload.partition(":")
+    chat_id = int(chat_id_s)
+    offset = int(offset_s)
+    if not await can_moderate(context, chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
         return
-
-    if data.startswith("rv_add:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Нет доступа", show_alert=True)
-            return
-        s = st(uid)
-        s["mode"] = "rv_add_wait"
-        s["rv_chat_id"] = chat_id
-        await q.edit_message_text("Пришли user_id, которого добавить в проверяющие.", reply_markup=reviewers_manage_kb(chat_id))
+    items, total, offset = await list_pending_submissions(chat_id, limit=10, offset=offset)
+    header = f"Очередь на проверку (pending): {total}"
+    kb = queue_kb(chat_id, items, total, offset=offset)
+    # при листании заголовок обычно тот же — меняем только клавиатуру (или ничего)
+    if getattr(q.message, "text", None) != header:
+        await q.edit_message_text(header, reply_markup=kb)
+    elif q.message.reply_markup != kb:
+        await q.edit_message_reply_markup(reply_markup=kb)
+
+async def cb_q_open(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id_s, _, sid_s = payload.partition(":")
+    chat_id = int(chat_id_s)
+    sid = int(sid_s)
+    if not await can_moderate(context, chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
         return
 
-    if data.startswith("rv_del:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Нет доступа", show_alert=True)
-            return
-        s = st(uid)
-        s["mode"] = "rv_del_wait"
-        s["rv_chat_id"] = chat_id
-        await q.edit_message_text("Пришли user_id, которого удалить из проверяющих.", reply_markup=reviewers_manage_kb(chat_id))
+    row = await get_submission(sid)
+    if not row or row[6] != STATUS_PENDING:
+        await q.answer("Уже обработано", show_alert=True)
         return
 
-    if data.startswith("ch_queue:"):
-        chat_id = int(data.split(":", 1)[1])
-        if not await can_moderate(context, chat_id, uid):
-            await q.answer("Нет доступа", show_alert=True)
-            return
+    _id, _chat_id_db, _sender_user_id, content_type, text, file_id, _status = row
+    header = f"🧾 Заявка #{sid}\nТип: {content_type}"
+    if text:
+        header += f"\n\nТекст/подпись:\n{text}"
 
-        total = await count_pending_submissions(chat_id)
-        items = await list_pending_submissions(chat_id, limit=10, offset=0)
-        await q.edit_message_text(
-            f"Очередь на проверку (pending): {total}",
-            reply_markup=queue_kb(chat_id, items, total, offset=0)
-        )
+    try:
+        if content_type == "text":
+            await q.edit_message_text(header, reply_markup=ticket_kb(sid))
+        else:
+            try:
+                await q.message.delete()
+            except Exception:
+                pass
+            pending = {"content_type": content_type, "text": text, "file_id": file_id}
+            await send_ticket_to_owner(context, uid, sid, pending)
+    except Exception:
+        await q.edit_message_text(header, reply_markup=ticket_kb(sid))
+
+async def cb_q_preview(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id_s, _, offset_s = payload.partition(":")
+    chat_id = int(chat_id_s)
+    offset = int(offset_s)
+    # on_menu уже ответил на callback (q.answer), повторный answer Telegram отклонит — пишем сообщением
+    if not await can_moderate(context, chat_id, uid):
+        await q.message.reply_text("Нет доступа.")
         return
-
-    if data.startswith("q_page:"):
-        _, chat_id_s, offset_s = data.split(":")
-        chat_id = int(chat_id_s)
-        offset = int(offset_s)
-        if not await can_moderate(context, chat_id, uid):
-            await q.answer("Нет доступа", show_alert=True)
-            return
-        total = await count_pending_submissions(chat_id)
-        items = await list_pending_submissions(chat_id, limit=10, offset=offset)
-        await q.edit_message_text(
-            f"Очередь на проверку (pending): {total}",
-            reply_markup=queue_kb(chat_id, items, total, offset=offset)
-        )
+    rows = await list_pending_media(chat_id, limit=10, offset=offset)
+    if not rows:
+        await q.message.reply_text("На этой странице нет медиа.")
         return
+    if not await send_ticket_previews(context, uid, rows):
+        await q.message.reply_text("Не удалось отправить превью.")
 
-    if data.startswith("q_open:"):
-        _, chat_id_s, sid_s = data.split(":")
-        chat_id = int(chat_id_s)
-        sid = int(sid_s)
-        if not await can_moderate(context, chat_id, uid):
-            await q.answer("Нет доступа", show_alert=True)
-            return
-
-        row = await get_submission(sid)
-        if not row or row[6] != STATUS_PENDING:
-            await q.answer("Уже обработано", show_alert=True)
-            return
-
-        _id, _chat_id_db, _sender_user_id, content_type, text, file_id, _status = row
-        header = f"🧾 Заявка #{sid}\nТип: {content_type}"
-        if text:
-            header += f"\n\nТекст/подпись:\n{text}"
-
-        try:
-            if content_type == "text":
-                await q.edit_message_text(header, reply_markup=ticket_kb(sid))
-            else:
-                try:
-                    await q.message.delete()
-                except Exception:
-                    pass
-                pending = {"content_type": content_type, "text": text, "file_id": file_id}
-                await send_ticket_to_owner(context, uid, sid, pending)
-        except Exception:
-            await q.edit_message_text(header, reply_markup=ticket_kb(sid))
+async def cb_ch_link(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, uid: int, payload: str):
+    chat_id = int(payload)
+    if not is_channel_owner(chat_id, uid):
+        await q.answer("Нет доступа", show_alert=True)
         return
 
-    if data.startswith("ch_link:"):
-        chat_id = int(data.split(":", 1)[1])
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await q.answer("Нет доступа", show_alert=True)
-            return
+    code = make_code_for_chat(chat_id)
+    await create_deeplink(code, chat_id)
 
-        code = make_code_for_chat(chat_id)
-        await create_deeplink(code, chat_id)
+    # username бота PTB получает один раз при initialize() — без лишнего get_me()
+    link = f"https://t.me/{context.bot.username}?start={code}"
 
-        me = await context.bot.get_me()
-        link = f"https://t.me/{me.username}?start={code}"
+    await q.edit_message_text(
+        "Ссылка для отправки в этот канал:\n"
+        f"{link}\n\n"
+        "Пользователь перейдёт по ссылке → бот запомнит канал → «Отправить».",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=f"ch_open:{chat_id}")]])
+    )
+    event_log(context, f"Сгенерирована ссылка: channel={chat_id}")
+
+MENU_ACTIONS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "menu_back": cb_menu_back,
+    "menu_policy": cb_menu_policy,
+    "menu_send": cb_menu_send,
+    "send_pick_channel": cb_send_pick_channel,
+    "menu_control": cb_menu_control,
+    "ctl_bind": cb_ctl_bind,
+    "ctl_list": cb_ctl_list,
+    "ch_open": cb_ch_open,
+    "ch_toggle": cb_ch_toggle,
+    "ch_reviewers_mode": cb_ch_reviewers_mode,
+    "ch_reviewers_manage": cb_ch_reviewers_manage,
+    "rv_add": cb_rv_add,
+    "rv_del": cb_rv_del,
+    "ch_queue": cb_ch_queue,
+    "q_page": cb_q_page,
+    "q_open": cb_q_open,
+    "q_preview": cb_q_preview,
+    "ch_link": cb_ch_link,
+}
 
-        await q.edit_message_text(
-            "Ссылка для отправки в этот канал:\n"
-            f"{link}\n\n"
-            "Пользователь перейдёт по ссылке → бот запомнит канал → «Отправить».",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=f"ch_open:{chat_id}")]])
-        )
-        await event_log(context, f"Сгенерирована ссылка: channel={chat_id}")
+async def on_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # gate (кроме кнопок политики)
+    if not await ensure_consent_or_show(update, context):
         return
 
+    q = update.callback_query
+    await q.answer()
+    # callback_data = "<action>" или "<action>:<payload>" — один partition и поиск в словаре
+    action, _, payload = q.data.partition(":")
+    handler = MENU_ACTIONS.get(action)
+    if handler is not None:
+        await handler(q, context, q.from_user.id, payload)
+
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # gate
     if not await ensure_consent_or_show(update, context):
@@ -984,13 +1278,13 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.message.text or "").strip()
 
     # manage selected reviewers add/del
-    if s.get("mode") in ("rv_add_wait", "rv_del_wait"):
-        chat_id = int(s.get("rv_chat_id") or 0)
-        row = await get_channel_by_chat_id(chat_id)
-        if not row or int(row[2]) != uid:
-            await update.message.reply_text("Нет доступа.", reply_markup=main_menu())
-            s["mode"] = None
-            s["rv_chat_id"] = None
+    if s.mode in ("rv_add_wait", "rv_del_wait"):
+        chat_id = int(s.rv_chat_id or 0)
+        if not is_channel_owner(chat_id, uid):
+            await update.message.reply_text("Нет доступа.", reply_markup=MAIN_MENU)
+            s.mode = None
+            s.rv_chat_id = None
+            reap_state(uid)
             return
 
         if not text.isdigit():
@@ -998,23 +1292,25 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         target = int(text)
-        if s["mode"] == "rv_add_wait":
-            await add_reviewer(chat_id, target)
-            await update.message.reply_text(f"Добавлен: {target}", reply_markup=main_menu())
-            await event_log(context, f"Добавлен проверяющий: channel={chat_id}")
+        # ответ сразу показывает обновлённый список — без лишнего клика «Управлять проверяющими»
+        if s.mode == "rv_add_wait":
+            reviewers = await add_reviewer(chat_id, target)
+            await update.message.reply_text(f"Добавлен: {target}\n\n{reviewers_text(reviewers)}", reply_markup=reviewers_manage_kb(chat_id))
+            event_log(context, f"Добавлен проверяющий: channel={chat_id}")
         else:
-            await remove_reviewer(chat_id, target)
-            await update.message.reply_text(f"Удалён: {target}", reply_markup=main_menu())
-            await event_log(context, f"Удалён проверяющий: channel={chat_id}")
+            reviewers = await remove_reviewer(chat_id, target)
+            await update.message.reply_text(f"Удалён: {target}\n\n{reviewers_text(reviewers)}", reply_markup=reviewers_manage_kb(chat_id))
+            event_log(context, f"Удалён проверяющий: channel={chat_id}")
 
-        s["mode"] = None
-        s["rv_chat_id"] = None
+        s.mode = None
+        s.rv_chat_id = None
+        reap_state(uid)
         return
 
     # bind flow
-    if s.get("mode") == "ctl_bind_wait":
+    if s.mode == "ctl_bind_wait":
         channel_in = normalize_channel_input(text)
-        if not CHANNEL_INPUT_RE.match(channel_in):
+        if channel_in is None:
             await update.message.reply_text("Неверный формат. Введи @username или -100....")
             return
 
@@ -1024,19 +1320,20 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         await upsert_channel(chat_id, username, uid, moderation=1)
-        s["mode"] = None
+        s.mode = None
+        reap_state(uid)
 
         await update.message.reply_text(
             f"✅ Канал привязан.\nchat_id: {chat_id}\nusername: {('@'+username) if username else 'нет'}\nМодерация: ВКЛ",
-            reply_markup=main_menu()
+            reply_markup=MAIN_MENU
         )
-        await event_log(context, f"Канал привязан: channel={chat_id}")
+        event_log(context, f"Канал привязан: channel={chat_id}")
         return
 
     # send: pick channel
-    if s.get("mode") == "send_pick_channel":
+    if s.mode == "send_pick_channel":
         channel_in = normalize_channel_input(text)
-        if not CHANNEL_INPUT_RE.match(channel_in):
+        if channel_in is None:
             await update.message.reply_text("Неверный формат. Введи @username или -100....")
             return
 
@@ -1048,26 +1345,27 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        s["selected_chat_id"] = registered_chat_id
-        s["mode"] = "send_wait_content"
+        s.selected_chat_id = registered_chat_id
+        s.mode = "send_wait_content"
         await update.message.reply_text(
             "Канал выбран.\nТеперь пришли текст или медиа (фото/видео/файл/голос) и, если нужно, подпись.\n"
             "После этого появится кнопка «Отправить».",
-            reply_markup=back_to_menu()
+            reply_markup=BACK_MENU
         )
         return
 
     # if channel selected, treat text as content
-    if s.get("selected_chat_id") and (s.get("mode") in (None, "send_wait_content")):
+    if s.selected_chat_id and (s.mode in (None, "send_wait_content")):
         if len(text) < 1:
             await update.message.reply_text("Пустое сообщение.")
             return
-        s["pending"] = {"content_type": "text", "text": text, "file_id": None}
-        s["mode"] = "send_wait_content"
-        await update.message.reply_text("Готово. Подтверди отправку:", reply_markup=confirm_send_kb())
+        s.pending = {"content_type": "text", "text": text, "file_id": None}
+        s.mode = "send_wait_content"
+        await update.message.reply_text("Готово. Подтверди отправку:", reply_markup=CONFIRM_SEND_KB)
         return
 
-    await update.message.reply_text("Нажми /start и выбери действие.", reply_markup=main_menu())
+    reap_state(uid)
+    await update.message.reply_text("Нажми /start и выбери действие.", reply_markup=MAIN_MENU)
 
 async def on_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # gate
@@ -1077,7 +1375,8 @@ async def on_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     s = st(uid)
 
-    if not s.get("selected_chat_id"):
+    if not s.selected_chat_id:
+        reap_state(uid)
         await update.message.reply_text("Сначала выбери канал: /start → «Отправить» → «Ввести канал».")
         return
 
@@ -1109,9 +1408,9 @@ async def on_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return
 
-    s["pending"] = {"content_type": content_type, "text": text, "file_id": file_id}
-    s["mode"] = "send_wait_content"
-    await update.message.reply_text("Файл получен. Подтверди отправку:", reply_markup=confirm_send_kb())
+    s.pending = {"content_type": content_type, "text": text, "file_id": file_id}
+    s.mode = "send_wait_content"
+    await update.message.reply_text("Файл получен. Подтверди отправку:", reply_markup=CONFIRM_SEND_KB)
 
 async def on_send_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # gate
@@ -1125,23 +1424,23 @@ async def on_send_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if q.data == "send_cancel":
         reset_send(uid)
-        await q.edit_message_text("Отменено.", reply_markup=main_menu())
+        await q.edit_message_text("Отменено.", reply_markup=MAIN_MENU)
         return
 
     if q.data != "send_confirm":
         return
 
-    chat_id = s.get("selected_chat_id")
-    pending = s.get("pending")
+    chat_id = s.selected_chat_id
+    pending = s.pending
 
     if not chat_id or not pending:
-        await q.edit_message_text("Нечего отправлять.", reply_markup=main_menu())
+        await q.edit_message_text("Нечего отправлять.", reply_markup=MAIN_MENU)
         reset_send(uid)
         return
 
     row = await get_channel_by_chat_id(int(chat_id))
     if not row:
-        await q.edit_message_text("Канал не зарегистрирован владельцем.", reply_markup=main_menu())
+        await q.edit_message_text("Канал не зарегистрирован владельцем.", reply_markup=MAIN_MENU)
         reset_send(uid)
         return
 
@@ -1157,22 +1456,26 @@ async def on_send_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
             file_id=pending.get("file_id"),
             status=STATUS_PENDING
         )
-        await q.edit_message_text("Сообщение отправлено на проверку 🕵️‍♂️", reply_markup=main_menu())
-        await send_ticket_to_owner(context, owner_user_id, sub_id, pending)
-
-        await event_log(context, f"Новое сообщение на проверку: channel={chat_id}, sid={sub_id}")
         reset_send(uid)
+        # ответ пользователю и тикет владельцу друг от друга не зависят
+        await asyncio.gather(
+            q.edit_message_text("Сообщение отправлено на проверку 🕵️‍♂️", reply_markup=MAIN_MENU),
+            send_ticket_to_owner(context, owner_user_id, sub_id, pending),
+        )
+        event_log(context, f"Новое сообщение на проверку: channel={chat_id}, sid={sub_id}")
         return
 
     # direct post
     try:
         await post_to_channel(context, int(chat_id), pending)
-        await create_submission(int(chat_id), uid, pending["content_type"], pending.get("text"), pending.get("file_id"), STATUS_SENT)
-        await q.edit_message_text("Сообщение отправлено ✅", reply_markup=main_menu())
-        await event_log(context, f"Сообщение отправлено напрямую: channel={chat_id}")
+        await asyncio.gather(
+            create_submission(int(chat_id), uid, pending["content_type"], pending.get("text"), pending.get("file_id"), STATUS_SENT),
+            q.edit_message_text("Сообщение отправлено ✅", reply_markup=MAIN_MENU),
+        )
+        event_log(context, f"Сообщение отправлено напрямую: channel={chat_id}")
     except Exception as e:
-        await q.edit_message_text(f"Не смог отправить в канал. Ошибка: {e}", reply_markup=main_menu())
-        await event_log(context, f"Ошибка отправки в канал: channel={chat_id}")
+        await q.edit_message_text(f"Не смог отправить в канал. Ошибка: {e}", reply_markup=MAIN_MENU)
+        event_log(context, f"Ошибка отправки в канал: channel={chat_id}")
     finally:
         reset_send(uid)
 
@@ -1184,12 +1487,9 @@ async def on_moderation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
     uid = q.from_user.id
-    data = q.data
-
-    if not (data.startswith("mod_ok:") or data.startswith("mod_no:")):
-        return
-
-    sub_id = int(data.split(":", 1)[1])
+    # MOD_CB_RE уже сопоставлен хэндлером — берём готовый match
+    m = context.matches[0]
+    sub_id = int(m["sid"])
     row = await get_submission(sub_id)
     if not row:
         await q.edit_message_text("Заявка не найдена.")
@@ -1206,61 +1506,86 @@ async def on_moderation(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     pending = {"content_type": content_type, "text": text, "file_id": file_id}
 
-    if data.startswith("mod_ok:"):
+    if m["act"] == "ok":
         try:
-            await context.bot.send_message(sender_user_id, "Отправка сообщения была одобрена проверкой ✅")
-        except Exception:
-            pass
-
-        try:
-            await post_to_channel(context, int(chat_id), pending)
+            # уведомление об одобрении уходит параллельно с публикацией (и всегда раньше «отправлено»)
+            await asyncio.gather(
+                notify_user(context, sender_user_id, "Отправка сообщения была одобрена проверкой ✅"),
+                post_to_channel(context, int(chat_id), pending),
+            )
             await set_submission_status(sub_id, STATUS_SENT)
-            try:
-                await context.bot.send_message(sender_user_id, "Сообщение отправлено ✅")
-            except Exception:
-                pass
-            await q.edit_message_text("✅ Одобрено и опубликовано")
-            await event_log(context, f"Сообщение одобрено и отправлено: channel={chat_id}, sid={sub_id}")
+            await asyncio.gather(
+                notify_user(context, sender_user_id, "Сообщение отправлено ✅"),
+                q.edit_message_text("✅ Одобрено и опубликовано"),
+            )
+            event_log(context, f"Сообщение одобрено и отправлено: channel={chat_id}, sid={sub_id}")
         except Exception as e:
             await q.edit_message_text(f"Ошибка отправки в канал: {e}")
-            await event_log(context, f"Ошибка при публикации после одобрения: channel={chat_id}, sid={sub_id}")
+            event_log(context, f"Ошибка при публикации после одобрения: channel={chat_id}, sid={sub_id}")
         return
 
     # reject
     await set_submission_status(sub_id, STATUS_REJECTED)
-    try:
-        await context.bot.send_message(sender_user_id, "Сообщение отклонено ❌")
-    except Exception:
-        pass
-    await q.edit_message_text("❌ Отклонено")
-    await event_log(context, f"Сообщение отклонено: channel={chat_id}, sid={sub_id}")
+    await asyncio.gather(
+        notify_user(context, sender_user_id, "Сообщение отклонено ❌"),
+        q.edit_message_text("❌ Отклонено"),
+    )
+    event_log(context, f"Сообщение отклонено: channel={chat_id}, sid={sub_id}")
+
+# ----------------- HTTP -----------------
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest, который разбирает JSON-ответы Telegram через orjson."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Dict[str, Any]:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # битый UTF-8 и т.п. — стандартный разбор с errors="replace"
+            return HTTPXRequest.parse_json_payload(payload)
 
 # ----------------- MAIN -----------------
 def main():
     setup_logging()
+    if POLICY_PARSE_MODE is None:
+        logger.warning("privacy_anon.md содержит неэкранированные символы MarkdownV2 — политика будет показана без разметки")
 
     # Termux / Python 3.12: ensure event loop exists
-    loop = asyncio.new_event_loop()
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     loop.run_until_complete(db_init_and_migrate())
 
     logger.info("Application starting")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    request_cls = OrjsonRequest if orjson else HTTPXRequest
+    # HTTP/2 (нужен пакет h2: pip install "httpx[http2]") мультиплексирует параллельные вызовы API
+    # по одному соединению. getUpdates — один long-poll, ему хватает HTTP/1.1 и пула по умолчанию.
+    http_version = "2" if importlib.util.find_spec("h2") else "1.1"
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(event_log_start)
+        .post_stop(event_log_stop)
+        .post_shutdown(db_close)
+        .request(request_cls(connection_pool_size=256, http_version=http_version))
+        .get_updates_request(request_cls())
+        .build()
+    )
 
     app.add_error_handler(on_error)
 
-    # minimal raw update logging (debug)
-    app.add_handler(TypeHandler(Update, log_update), group=-100)
+    # minimal raw update logging (debug) — лишний хэндлер на каждый апдейт, поэтому только по флагу
+    if LOG_UPDATES:
+        app.add_handler(TypeHandler(Update, log_update), group=-100)
 
     app.add_handler(CommandHandler("start", start_cmd))
 
     # policy accept/decline must work even if user not accepted yet
-    app.add_handler(CallbackQueryHandler(on_policy_callbacks, pattern=r"^(policy_accept|policy_decline)$"))
+    app.add_handler(CallbackQueryHandler(on_policy_callbacks, pattern=POLICY_CB_RE))
 
     # order matters: moderation callbacks first, then send buttons, then menu
-    app.add_handler(CallbackQueryHandler(on_moderation, pattern=r"^(mod_ok:|mod_no:)"))
-    app.add_handler(CallbackQueryHandler(on_send_buttons, pattern=r"^(send_confirm|send_cancel)$"))
+    app.add_handler(CallbackQueryHandler(on_moderation, pattern=MOD_CB_RE))
+    app.add_handler(CallbackQueryHandler(on_send_buttons, pattern=SEND_CB_RE))
     app.add_handler(CallbackQueryHandler(on_menu))  # everything else (menus, queue, settings)
 
     # media first
@@ -1270,7 +1595,19 @@ def main():
     ))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
 
-    app.run_polling(drop_pending_updates=True)
+    if WEBHOOK_URL:
+        # нужен python-telegram-bot[webhooks] (tornado); путь — хэш токена, чтобы сам токен не светился в логах прокси
+        url_path = hashlib.sha256(BOT_TOKEN.encode()).hexdigest()[:32]
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=url_path,
+            webhook_url=f"{WEBHOOK_URL}/{url_path}",
+            drop_pending_updates=True,
+            max_connections=100,
+        )
+    else:
+        app.run_polling(drop_pending_updates=True)
 
     logger.info("Application stopped")
 